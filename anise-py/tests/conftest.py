@@ -0,0 +1,50 @@
+from os import environ
+from pathlib import Path
+
+import pytest
+
+from anise import Almanac, MetaAlmanac
+
+DATA_DIR = (Path(__file__).parent / ".." / ".." / "data").resolve()
+
+
+def _in_ci():
+    """
+    Returns whether the tests run in CI: a CI variable set to "false" or "0" does not count.
+    """
+    return environ.get("CI", "").lower() in ("1", "true", "yes")
+
+
+def load_almanac():
+    """
+    Loads the almanac used by the tests: from the meta almanac in CI, and from the local data folder otherwise.
+    This is the Python equivalent to the almanac built in anise/tests/almanac/mod.rs
+    """
+    if _in_ci():
+        # Load from meta kernel to not use Git LFS quota
+        meta = MetaAlmanac(str(DATA_DIR / "ci_config.dhall"))
+        print(meta)
+        # Process the files to be loaded
+        return meta.process()
+    else:
+        # Must ensure that the path is a string
+        ctx = Almanac(str(DATA_DIR / "de440s.bsp"))
+        # Let's add another file here -- note that the Almanac will load into a NEW variable, so we must overwrite it!
+        # This prevents memory leaks (yes, I promise)
+        return ctx.load(str(DATA_DIR / "pck08.pca")).load(
+            str(DATA_DIR / "earth_latest_high_prec.bpc")
+        )
+
+
+@pytest.fixture(scope="session")
+def almanac():
+    """
+    Loads the almanac once for the whole test session, since parsing the kernels dominates the run time of the tests.
+    """
+    try:
+        return load_almanac()
+    except Exception as e:
+        if _in_ci() and "lfs" in str(e):
+            # Must be some LFS error in the CI again
+            pytest.skip(f"could not process the meta almanac: {e}")
+        raise  # Otherwise, raise the error!
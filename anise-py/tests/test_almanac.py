@@ -1,47 +1,30 @@
+from math import isclose
 from pathlib import Path
 import pickle
 
+import pytest
+
 from anise import Almanac, MetaAlmanac
 from anise.astro import *
 from anise.astro.constants import Frames
-from anise.time import Epoch
+from anise.time import Epoch, TimeSeries, Unit
+from anise.utils import convert_tpc
 
-from os import environ
+DATA_DIR = (Path(__file__).parent / ".." / ".." / "data").resolve()
 
 
-def test_state_transformation():
+def test_state_transformation(almanac):
     """
     This is the Python equivalent to anise/tests/almanac/mod.rs
-    but the data is loaded from the remote servers
+    but the data is loaded from the remote servers in the CI
     """
 
-    if environ.get("CI", False):
-        # Load from meta kernel to not use Git LFS quota
-        data_path = Path(__file__).parent.joinpath("..", "..", "data", "ci_config.dhall")
-        meta = MetaAlmanac(str(data_path))
-        print(meta)
-        # Process the files to be loaded
-        try:
-            ctx = meta.process()
-        except Exception as e:
-            if "lfs" in str(e):
-                # Must be some LFS error in the CI again
-                return
-            raise # Otherwise, raise the error!
-    else:
-        data_path = Path(__file__).parent.joinpath("..", "..", "data")
-        # Must ensure that the path is a string
-        ctx = Almanac(str(data_path.joinpath("de440s.bsp")))
-        # Let's add another file here -- note that the Almanac will load into a NEW variable, so we must overwrite it!
-        # This prevents memory leaks (yes, I promise)
-        ctx = ctx.load(str(data_path.joinpath("pck08.pca"))).load(
-            str(data_path.joinpath("earth_latest_high_prec.bpc"))
-        )
+    ctx = almanac
 
     eme2k = ctx.frame_info(Frames.EME2000)
     assert eme2k.mu_km3_s2() == 398600.435436096
     assert eme2k.shape.polar_radius_km == 6356.75
-    assert abs(eme2k.shape.flattening() - 0.0033536422844278) < 2e-16
+    assert isclose(eme2k.shape.flattening(), 0.0033536422844278, rel_tol=0, abs_tol=2e-16)
 
     epoch = Epoch("2021-10-29 12:34:56 TDB")
 
@@ -56,31 +39,26 @@ def test_state_transformation():
         eme2k,
     )
 
-    assert abs(orig_state.sma_km() - 8191.93) < 1e-10
-    assert abs(orig_state.ecc() - 1.000000000361619e-06) < 1e-10
-    assert abs(orig_state.inc_deg() - 12.849999999999987) < 1e-10
-    assert abs(orig_state.raan_deg() - 306.614) < 1e-10
-    assert abs(orig_state.tlong_deg() - 0.6916999999999689) < 1e-10
+    assert isclose(orig_state.sma_km(), 8191.93, rel_tol=0, abs_tol=1e-10)
+    assert isclose(orig_state.ecc(), 1.000000000361619e-06, rel_tol=0, abs_tol=1e-10)
+    assert isclose(orig_state.inc_deg(), 12.849999999999987, rel_tol=0, abs_tol=1e-10)
+    assert isclose(orig_state.raan_deg(), 306.614, rel_tol=0, abs_tol=1e-10)
+    assert isclose(orig_state.tlong_deg(), 0.6916999999999689, rel_tol=0, abs_tol=1e-10)
 
     # In Python, we can set the aberration to None
     aberration = None
 
     state_itrf93 = ctx.transform_to(orig_state, Frames.EARTH_ITRF93, aberration)
 
-    print(orig_state)
-    print(state_itrf93)
-
-    assert abs(state_itrf93.latitude_deg() - 10.549246868302738) < 1e-10
-    assert abs(state_itrf93.longitude_deg() - 133.76889100913047) < 1e-10
-    assert abs(state_itrf93.height_km() - 1814.503598063825) < 1e-10
+    assert isclose(state_itrf93.latitude_deg(), 10.549246868302738, rel_tol=0, abs_tol=1e-10)
+    assert isclose(state_itrf93.longitude_deg(), 133.76889100913047, rel_tol=0, abs_tol=1e-10)
+    assert isclose(state_itrf93.height_km(), 1814.503598063825, rel_tol=0, abs_tol=1e-10)
 
     # Convert back
     from_state_itrf93_to_eme2k = ctx.transform_to(
         state_itrf93, Frames.EARTH_J2000, aberration
     )
 
-    print(from_state_itrf93_to_eme2k)
-
     assert orig_state == from_state_itrf93_to_eme2k
 
     # Demo creation of a ground station
@@ -96,20 +74,66 @@ def test_state_transformation():
         itrf93,
     )
 
-    assert abs(paris.latitude_deg() - 48.8566) < 1e-3
-    assert abs(paris.longitude_deg() - 2.3522) < 1e-3
-    assert abs(paris.height_km() - 0.4) < 1e-3
+    assert isclose(paris.latitude_deg(), 48.8566, rel_tol=0, abs_tol=1e-3)
+    assert isclose(paris.longitude_deg(), 2.3522, rel_tol=0, abs_tol=1e-3)
+    assert isclose(paris.height_km(), 0.4, rel_tol=0, abs_tol=1e-3)
+
+    # Batched transformations cross into Rust once for the whole time series, and must match the single epoch calls
+    start = epoch
+    stop = epoch + Unit.Hour * 1
+    expected_n = int(stop.timedelta(start).to_unit(Unit.Minute))
+    time_series = TimeSeries(start, stop, Unit.Minute * 1, False)
+    states = ctx.transform_many(Frames.EARTH_J2000, Frames.SUN_J2000, time_series, None)
+    assert len(states) == expected_n
+    assert states[0] == ctx.transform(Frames.EARTH_J2000, Frames.SUN_J2000, start, None)
+
+
+def test_transform_many_array(almanac):
+    """
+    The array variant of transform_many requires NumPy, which is an optional dependency of anise.
+    """
+    pytest.importorskip("numpy")
+
+    start = Epoch("2021-10-29 12:34:56 TDB")
+    stop = start + Unit.Hour * 1
+    expected_n = int(stop.timedelta(start).to_unit(Unit.Minute))
+    time_series = TimeSeries(start, stop, Unit.Minute * 1, False)
+    states = almanac.transform_many(Frames.EARTH_J2000, Frames.SUN_J2000, time_series, None)
+
+    epochs_tai_s, pos_vel = almanac.transform_many_array(Frames.EARTH_J2000, Frames.SUN_J2000, time_series, None)
+    assert epochs_tai_s.shape == (expected_n,)
+    assert pos_vel.shape == (expected_n, 6)
+    assert epochs_tai_s[0] == start.to_tai_seconds()
+    assert pos_vel[0, 0] == states[0].x_km
+    assert pos_vel[-1, 5] == states[-1].vz_km_s
 
-    # Pickling test
-    pickle.loads(pickle.dumps(eme2k)) == eme2k
-    pickle.loads(pickle.dumps(eme2k.shape)) == eme2k.shape
-    # Cannot yet pickle Epoch, so we can't pickle an Orbit yet
-    # cf. https://github.com/nyx-space/hifitime/issues/270
+    _, pos_vel_f32 = almanac.transform_many_array(Frames.EARTH_J2000, Frames.SUN_J2000, time_series, None, "float32")
+    assert pos_vel_f32.dtype.itemsize == 4
+    assert isclose(pos_vel_f32[0, 0], pos_vel[0, 0], rel_tol=1e-7)
+
+    with pytest.raises(ValueError):
+        almanac.transform_many_array(Frames.EARTH_J2000, Frames.SUN_J2000, time_series, None, "int32")
+
+
+def test_pickle():
+    """
+    Pickling does not require any loaded data, so it is tested on a frame built from the EME2000 constants.
+    """
+    eme2k = Frame(399, 1, 398600.435436096, Ellipsoid(6378.1366, 6356.75))
+
+    assert pickle.loads(pickle.dumps(eme2k)) == eme2k
+    assert pickle.loads(pickle.dumps(eme2k.shape)) == eme2k.shape
+
+    # Epoch cannot be pickled yet (cf. https://github.com/nyx-space/hifitime/issues/270),
+    # so the Orbit pickles its epoch itself, including its time scale.
+    orbit = Orbit(-2436.45, -2436.45, 6891.037, 5.088611, -5.088611, 0.0, Epoch("2021-10-29 12:34:56.123456789 TDB"), eme2k)
+    unpickled = pickle.loads(pickle.dumps(orbit))
+    assert unpickled == orbit
+    assert str(unpickled.epoch) == str(orbit.epoch)
 
 
 def test_meta_load():
-    data_path = Path(__file__).parent.joinpath("..", "..", "data", "local.dhall")
-    meta = MetaAlmanac(str(data_path))
+    meta = MetaAlmanac(str(DATA_DIR / "local.dhall"))
     print(meta)
     try:
         # Process the files to be loaded
@@ -122,7 +146,25 @@ def test_meta_load():
         eme2k = almanac.frame_info(Frames.EME2000)
         assert eme2k.mu_km3_s2() == 398600.435436096
         assert eme2k.shape.polar_radius_km == 6356.75
-        assert abs(eme2k.shape.flattening() - 0.0033536422844278) < 2e-16
+        assert isclose(eme2k.shape.flattening(), 0.0033536422844278, rel_tol=0, abs_tol=2e-16)
+
+
+def test_convert_tpc(tmp_path):
+    """
+    Converts the KPL/TPC files into a PCA file in a per-test temporary directory, so that
+    concurrent test runs never write to the same file.
+    """
+    pca_path = str(tmp_path / "test_constants.pca")
+    pck_path = str(DATA_DIR / "pck00008.tpc")
+    gm_path = str(DATA_DIR / "gm_de431.tpc")
+
+    convert_tpc(pck_path, gm_path, pca_path)
+    # Converting again onto the same file requires the overwrite flag
+    convert_tpc(pck_path, gm_path, pca_path, True)
+
+    eme2k = Almanac(pca_path).frame_info(Frames.EME2000)
+    assert eme2k.mu_km3_s2() == 398600.435436096
+    assert eme2k.shape.polar_radius_km == 6356.75
 
 
 def test_exports():
@@ -139,7 +181,19 @@ def test_frame_defs():
 
 
 if __name__ == "__main__":
+    from tempfile import TemporaryDirectory
+
+    # Outside of pytest, build the fixtures by hand
+    from conftest import load_almanac
+
     test_meta_load()
     test_exports()
     test_frame_defs()
-    test_state_transformation()
+    test_pickle()
+
+    almanac = load_almanac()
+    test_state_transformation(almanac)
+    test_transform_many_array(almanac)
+
+    with TemporaryDirectory() as tmp_dir:
+        test_convert_tpc(Path(tmp_dir))
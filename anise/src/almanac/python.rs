@@ -12,10 +12,32 @@ use super::{
     planetary::{PlanetaryDataError, PlanetaryDataSetSnafu},
     Almanac,
 };
-use crate::prelude::Frame;
+use crate::errors::AlmanacResult;
+use crate::math::cartesian::CartesianState;
+use crate::prelude::{Aberration, Frame};
+use hifitime::TimeSeries;
+use numpy::ndarray::Array2;
+use numpy::{dtype_bound, IntoPyArray, PyArray1, PyArrayDescr, PyArrayDescrMethods};
+use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
+use rayon::prelude::*;
 use snafu::prelude::*;
 
+/// Position and velocity array of `transform_many_array`, in the precision requested by the caller.
+enum PosVelArray {
+    Double(Array2<f64>),
+    Single(Array2<f32>),
+}
+
+/// Returns the j-th component of the position (km) then velocity (km/s) of this state.
+fn pos_vel_component(state: &CartesianState, j: usize) -> f64 {
+    if j < 3 {
+        state.radius_km[j]
+    } else {
+        state.velocity_km_s[j - 3]
+    }
+}
+
 #[pymethods]
 impl Almanac {
     pub fn frame_info(&self, uid: Frame) -> Result<Frame, PlanetaryDataError> {
@@ -27,4 +49,113 @@ impl Almanac {
             })?
             .to_frame(uid.into()))
     }
+
+    /// Returns the Cartesian states needed to transform the `from_frame` to the `to_frame` at each epoch of the time series.
+    /// This is equivalent to calling `transform` for each epoch, but crosses the Python boundary only once,
+    /// and the epochs are computed in parallel since each of them is independent.
+    /// The GIL is released during the computation, so other Python threads keep running. This is also required
+    /// for the rayon workers themselves: logging goes through pyo3-log, which needs the GIL.
+    ///
+    /// # Note
+    /// The units will be those of the underlying ephemeris data (typically km and km/s)
+    pub fn transform_many(
+        &self,
+        py: Python,
+        target_frame: Frame,
+        observer_frame: Frame,
+        time_series: TimeSeries,
+        ab_corr: Option<Aberration>,
+    ) -> AlmanacResult<Vec<CartesianState>> {
+        py.allow_threads(|| {
+            self.par_transform_many(target_frame, observer_frame, time_series, ab_corr)
+        })
+    }
+
+    /// Returns the TAI seconds of each epoch of the time series, and the Cartesian states needed to transform
+    /// the `from_frame` to the `to_frame` as an N×6 array of the position and velocity at each of these epochs.
+    /// This computes the same states as `transform_many`, but returns them as two contiguous NumPy arrays
+    /// instead of a list of one Python object per state. NumPy is an optional dependency: install it with `anise[numpy]`.
+    ///
+    /// The states are computed in double precision. If `dtype` is `numpy.float32`, they are only cast to single
+    /// precision when the array is filled, which halves its size for consumers that only plot or export them.
+    /// Single precision keeps about seven significant digits: around a meter for low Earth orbits but several
+    /// kilometers for heliocentric distances. The epochs are always returned in double precision.
+    ///
+    /// # Note
+    /// The units will be those of the underlying ephemeris data (typically km and km/s)
+    pub fn transform_many_array<'py>(
+        &self,
+        py: Python<'py>,
+        target_frame: Frame,
+        observer_frame: Frame,
+        time_series: TimeSeries,
+        ab_corr: Option<Aberration>,
+        dtype: Option<Bound<'py, PyAny>>,
+    ) -> PyResult<(Bound<'py, PyArray1<f64>>, PyObject)> {
+        let single_precision = match dtype {
+            None => false,
+            Some(dtype) => {
+                let dtype = PyArrayDescr::new_bound(py, &dtype)?;
+                if dtype.is_equiv_to(&dtype_bound::<f64>(py)) {
+                    false
+                } else if dtype.is_equiv_to(&dtype_bound::<f32>(py)) {
+                    true
+                } else {
+                    return Err(PyValueError::new_err(format!(
+                        "unsupported dtype {dtype}, use float64 or float32"
+                    )));
+                }
+            }
+        };
+
+        // The arrays are also filled without the GIL, which is only needed to hand them over to NumPy.
+        let (epochs_tai_s, pos_vel) = py.allow_threads(|| -> AlmanacResult<_> {
+            let states =
+                self.par_transform_many(target_frame, observer_frame, time_series, ab_corr)?;
+
+            let epochs_tai_s: Vec<f64> = states
+                .iter()
+                .map(|state| state.epoch.to_tai_seconds())
+                .collect();
+
+            // Each array is built directly in the requested precision, so the f32 path only allocates once.
+            let shape = (states.len(), 6);
+            let pos_vel = if single_precision {
+                PosVelArray::Single(Array2::from_shape_fn(shape, |(i, j)| {
+                    pos_vel_component(&states[i], j) as f32
+                }))
+            } else {
+                PosVelArray::Double(Array2::from_shape_fn(shape, |(i, j)| {
+                    pos_vel_component(&states[i], j)
+                }))
+            };
+
+            Ok((epochs_tai_s, pos_vel))
+        })?;
+
+        let pos_vel = match pos_vel {
+            PosVelArray::Double(pos_vel) => pos_vel.into_pyarray_bound(py).into_py(py),
+            PosVelArray::Single(pos_vel) => pos_vel.into_pyarray_bound(py).into_py(py),
+        };
+
+        Ok((PyArray1::from_vec_bound(py, epochs_tai_s), pos_vel))
+    }
+}
+
+impl Almanac {
+    /// Computes the states of `transform_many` in parallel. This must be called without holding the GIL.
+    fn par_transform_many(
+        &self,
+        target_frame: Frame,
+        observer_frame: Frame,
+        time_series: TimeSeries,
+        ab_corr: Option<Aberration>,
+    ) -> AlmanacResult<Vec<CartesianState>> {
+        let epochs: Vec<_> = time_series.collect();
+        // Collecting the parallel iterator preserves the order of the time series.
+        epochs
+            .into_par_iter()
+            .map(|epoch| self.transform(target_frame, observer_frame, epoch, ab_corr))
+            .collect()
+    }
 }
@@ -181,12 +181,28 @@ impl Almanac {
             }
         }
 
-        error!("Almanac: No summary {id} valid");
         // If we're reached this point, there is no relevant summary
-        Err(EphemerisError::SPK {
+        Err(Self::spk_summary_id_error(id))
+    }
+
+    /// Returns an iterator over the summaries whose ID matches the desired `id`, in reverse loading order.
+    fn spk_summaries_iter(&self, id: NaifId) -> impl Iterator<Item = &SPKSummaryRecord> + '_ {
+        self.spk_data
+            .iter()
+            .take(self.num_loaded_spk())
+            .rev()
+            .filter_map(|maybe_spk| maybe_spk.as_ref().unwrap().data_summaries().ok())
+            .flatten()
+            .filter(move |summary| summary.id() == id)
+    }
+
+    /// Logs and returns the error of a search for the SPK summaries of an ID that is not loaded.
+    fn spk_summary_id_error(id: NaifId) -> EphemerisError {
+        error!("Almanac: No summary {id} valid");
+        EphemerisError::SPK {
             action: "searching for SPK summary",
             source: DAFError::SummaryIdError { kind: "SPK", id },
-        })
+        }
     }
 }
 
@@ -197,25 +213,11 @@ impl Almanac {
     /// # Warning
     /// This function performs a memory allocation.
     pub fn spk_summaries(&self, id: NaifId) -> Result<Vec<SPKSummaryRecord>, EphemerisError> {
-        let mut summaries = vec![];
-        for maybe_spk in self.spk_data.iter().take(self.num_loaded_spk()).rev() {
-            let spk = maybe_spk.as_ref().unwrap();
-            if let Ok(these_summaries) = spk.data_summaries() {
-                for summary in these_summaries {
-                    if summary.id() == id {
-                        summaries.push(*summary);
-                    }
-                }
-            }
-        }
+        let summaries: Vec<SPKSummaryRecord> = self.spk_summaries_iter(id).copied().collect();
 
         if summaries.is_empty() {
-            error!("Almanac: No summary {id} valid");
             // If we're reached this point, there is no relevant summary
-            Err(EphemerisError::SPK {
-                action: "searching for SPK summary",
-                source: DAFError::SummaryIdError { kind: "SPK", id },
-            })
+            Err(Self::spk_summary_id_error(id))
         } else {
             Ok(summaries)
         }
@@ -223,22 +225,16 @@ impl Almanac {
 
     /// Returns the applicable domain of the request id, i.e. start and end epoch that the provided id has loaded data.
     pub fn spk_domain(&self, id: NaifId) -> Result<(Epoch, Epoch), EphemerisError> {
-        let summaries = self.spk_summaries(id)?;
-
-        // We know that the summaries is non-empty because if it is, the previous function call returns an error.
-        let start = summaries
-            .iter()
-            .min_by_key(|summary| summary.start_epoch())
-            .unwrap()
-            .start_epoch();
-
-        let end = summaries
-            .iter()
-            .max_by_key(|summary| summary.end_epoch())
-            .unwrap()
-            .end_epoch();
-
-        Ok((start, end))
+        // Fold over the summaries instead of collecting them with `spk_summaries`, which allocates.
+        self.spk_summaries_iter(id)
+            .fold(None::<(Epoch, Epoch)>, |domain, summary| match domain {
+                Some((start, end)) => Some((
+                    start.min(summary.start_epoch()),
+                    end.max(summary.end_epoch()),
+                )),
+                None => Some((summary.start_epoch(), summary.end_epoch())),
+            })
+            .ok_or_else(|| Self::spk_summary_id_error(id))
     }
 
     /// Returns a map of each loaded SPK ID to its domain validity.
@@ -12,11 +12,15 @@
 
 use super::cartesian::CartesianState;
 use crate::prelude::Frame;
-use hifitime::Epoch;
-use pyo3::exceptions::PyTypeError;
+use core::str::FromStr;
+use hifitime::{Duration, Epoch, TimeScale};
+use pyo3::exceptions::{PyTypeError, PyValueError};
 use pyo3::prelude::*;
 use pyo3::pyclass::CompareOp;
-use pyo3::types::PyType;
+use pyo3::types::{PyBytes, PyType};
+
+/// Pickled length of a state: six f64 for the position and velocity, then the i16 centuries and u64 nanoseconds of the epoch.
+const PICKLE_LEN: usize = 6 * 8 + 2 + 8;
 
 #[pymethods]
 impl CartesianState {
@@ -148,18 +152,64 @@ impl CartesianState {
         }
     }
 
+    /// Pickles this state as the raw little-endian bytes of its position and velocity (km and km/s) and of its epoch,
+    /// because Epoch cannot be pickled yet (cf. https://github.com/nyx-space/hifitime/issues/270).
     #[allow(clippy::type_complexity)]
     #[cfg(feature = "python")]
-    fn __getnewargs__(&self) -> Result<(f64, f64, f64, f64, f64, f64, Epoch, Frame), PyErr> {
+    fn __reduce__<'py>(
+        slf: &Bound<'py, Self>,
+    ) -> PyResult<(Bound<'py, PyAny>, (Bound<'py, PyBytes>, String, Frame))> {
+        let state = slf.borrow();
+
+        let mut buf = Vec::with_capacity(PICKLE_LEN);
+        for val in state.radius_km.iter().chain(state.velocity_km_s.iter()) {
+            buf.extend_from_slice(&val.to_le_bytes());
+        }
+        let (centuries, nanoseconds) = state.epoch.duration.to_parts();
+        buf.extend_from_slice(&centuries.to_le_bytes());
+        buf.extend_from_slice(&nanoseconds.to_le_bytes());
+
         Ok((
-            self.radius_km[0],
-            self.radius_km[1],
-            self.radius_km[2],
-            self.velocity_km_s[0],
-            self.velocity_km_s[1],
-            self.velocity_km_s[2],
-            self.epoch,
-            self.frame,
+            slf.get_type().getattr("_from_pickle")?,
+            (
+                PyBytes::new_bound(slf.py(), &buf),
+                format!("{}", state.epoch.time_scale),
+                state.frame,
+            ),
+        ))
+    }
+
+    /// Rebuilds a state from the arguments returned by `__reduce__`.
+    #[classmethod]
+    #[pyo3(name = "_from_pickle")]
+    fn from_pickle(
+        _cls: &Bound<'_, PyType>,
+        buf: &[u8],
+        time_scale: &str,
+        frame: Frame,
+    ) -> PyResult<Self> {
+        if buf.len() != PICKLE_LEN {
+            return Err(PyValueError::new_err(format!(
+                "expected {PICKLE_LEN} bytes to unpickle an Orbit, got {}",
+                buf.len()
+            )));
+        }
+
+        let f64_at = |i: usize| f64::from_le_bytes(buf[8 * i..8 * (i + 1)].try_into().unwrap());
+        let centuries = i16::from_le_bytes(buf[48..50].try_into().unwrap());
+        let nanoseconds = u64::from_le_bytes(buf[50..58].try_into().unwrap());
+        let time_scale =
+            TimeScale::from_str(time_scale).map_err(|e| PyValueError::new_err(e.to_string()))?;
+
+        Ok(Self::new(
+            f64_at(0),
+            f64_at(1),
+            f64_at(2),
+            f64_at(3),
+            f64_at(4),
+            f64_at(5),
+            Epoch::from_duration(Duration::from_parts(centuries, nanoseconds), time_scale),
+            frame,
         ))
     }
 }
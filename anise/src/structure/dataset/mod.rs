@@ -395,16 +395,17 @@ impl<T: DataSetT, const ENTRIES: usize> DataSet<T, ENTRIES> {
             }
         }
 
+        // Encode before creating the file, so that an encoding error does not truncate an existing file.
         let mut buf = vec![];
+        if let Err(err) = self.encode_to_vec(&mut buf) {
+            return Err(DataSetError::DataDecoding {
+                action: "encoding data set",
+                source: DecodingError::DecodingDer { err },
+            });
+        }
 
         match File::create(filename) {
             Ok(mut file) => {
-                if let Err(err) = self.encode_to_vec(&mut buf) {
-                    return Err(DataSetError::DataDecoding {
-                        action: "encoding data set",
-                        source: DecodingError::DecodingDer { err },
-                    });
-                }
                 if let Err(source) = file.write_all(&buf) {
                     Err(DataSetError::IO {
                         source,
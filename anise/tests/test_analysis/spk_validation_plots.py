@@ -1,59 +1,228 @@
+import webbrowser
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from glob import glob
-from os import environ
-from os.path import abspath, basename, dirname, join
+from os import cpu_count, environ, getpid, replace
+from os.path import abspath, basename, dirname, exists, getmtime, join, splitext
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+
+# The errors are only plotted and summarized, so single precision is plenty. The epoch stays in
+# double precision: ET seconds are of the order of 1e9, which float32 would round to about a minute.
+FLOAT32_COLUMNS = {"Absolute difference": "float32"}
+
+POSITION_COMPONENTS = ["X", "Y", "Z"]
+
+# Beyond this many points, a scatter plot only grows the HTML payload without showing anything new.
+# The largest errors of the dropped points are overlaid so that the extremes remain visible.
+MAX_PLOTTED_POINTS = 20_000
+NUM_OUTLIERS = 100
+
+# Every plot loads the same plotly.js bundle from the output folder instead of embedding its own copy.
+PLOTLY_JS = "plotly.min.js"
+
+
+def read_parquet_table(filename, columns):
+    """
+    Reads the provided columns of this parquet file with the engine named in ANISE_PARQUET_ENGINE.
+    Defaults to pyarrow; `polars` runs a lazy scan with projection pushdown on its own thread pool, and
+    `fastparquet` is an optional engine. Both are only imported when requested.
+    """
+    engine = environ.get("ANISE_PARQUET_ENGINE", "pyarrow")
+
+    if engine == "pyarrow":
+        # The dataset scanner decodes the projected column chunks on the Arrow thread pool, and pre-buffering
+        # coalesces the reads of these column chunks into a few large requests.
+        return ds.dataset(filename, format="parquet").to_table(
+            columns=columns, fragment_scan_options=ds.ParquetFragmentScanOptions(pre_buffer=True)
+        )
+    elif engine == "polars":
+        import polars as pl
+
+        return pl.scan_parquet(filename).select(columns).collect().to_arrow()
+    elif engine == "fastparquet":
+        from fastparquet import ParquetFile
+
+        df = ParquetFile(filename).to_pandas(columns=columns)
+        return pa.Table.from_pandas(df, preserve_index=False)
+    else:
+        raise ValueError(f"unsupported ANISE_PARQUET_ENGINE `{engine}`, use `pyarrow`, `polars` or `fastparquet`")
+
+
+def load_validation(filename, columns):
+    """
+    Returns the provided columns of the validation data of this parquet file as an Arrow table.
+    The first call caches them as an uncompressed Arrow IPC file next to the parquet file, which later runs
+    memory map instead of decompressing and decoding the parquet file again: repeated runs then only pay
+    for page faults, which the page cache shares across runs and worker processes.
+    """
+    cache_path = f"{splitext(filename)[0]}.arrow"
+
+    if exists(cache_path) and getmtime(cache_path) >= getmtime(filename):
+        # Memory mapping only reads the schema until the columns are actually accessed
+        table = feather.read_table(cache_path, memory_map=True)
+        if set(columns).issubset(table.column_names):
+            return table.select(columns)
+
+    table = read_parquet_table(filename, columns)
+    # Write then rename so that an interrupted run never leaves a truncated cache behind
+    feather.write_feather(table, f"{cache_path}.tmp", compression="uncompressed")
+    replace(f"{cache_path}.tmp", cache_path)
+
+    return feather.read_table(cache_path, memory_map=True)
+
+
+def scatter(plt, df, x_col, y_col, color_col, title):
+    """
+    Replaces the traces of the provided figure with a WebGL scatter plot of this data frame, with one trace per value of `color_col`.
+    The figure is reused across plots so that its template and layout are only initialized once.
+    The traces are built straight from the column arrays, evenly strided along `x_col` if too dense to plot.
+    """
+    plotted = df
+    if len(df) > MAX_PLOTTED_POINTS:
+        stride = -(-len(df) // MAX_PLOTTED_POINTS)
+        plotted = df.sort_values(x_col, kind="stable").iloc[::stride]
+        title = f"{title} (1 in {stride} points)"
+
+    plt.data = []
+    # Only iterate over the categories actually present in this subset
+    for group, group_df in plotted.groupby(color_col, observed=True):
+        plt.add_trace(go.Scattergl(x=group_df[x_col].to_numpy(),
+                                   y=group_df[y_col].to_numpy(),
+                                   mode="markers",
+                                   name=str(group)))
+
+    if plotted is not df:
+        outliers = df.nlargest(NUM_OUTLIERS, y_col)
+        plt.add_trace(go.Scattergl(x=outliers[x_col].to_numpy(),
+                                   y=outliers[y_col].to_numpy(),
+                                   mode="markers",
+                                   marker_symbol="x",
+                                   name=f"{NUM_OUTLIERS} largest"))
+
+    plt.update_layout(title_text=title, xaxis_title=x_col, yaxis_title=y_col, legend_title_text=color_col)
+
+
+def write_text(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def write_plotly_js(out_dir):
+    """
+    Writes the plotly.js bundle referenced by the HTML plots into `out_dir`, unless it is already there.
+    Several worker processes may race to write it, so each writes its own temporary file before renaming it.
+    """
+    path = join(out_dir, PLOTLY_JS)
+    if not exists(path):
+        write_text(f"{path}.{getpid()}.tmp", get_plotlyjs())
+        replace(f"{path}.{getpid()}.tmp", path)
+
+
+def summarize(df, columns):
+    """
+    Returns the count, mean, sample standard deviation, minimum, and maximum of each of the provided numerical columns.
+    These are computed with the Arrow aggregation kernels on views of the column arrays, skipping the quantiles of `describe()`.
+    """
+    lines = []
+    for col in columns:
+        values = pa.array(df[col].to_numpy())
+        if len(values) == 0:
+            lines.append(f"{col}: count=0")
+            continue
+        min_max = pc.min_max(values)
+        # Sample standard deviation, like `describe()`: it is null for a single value, where `describe()` shows NaN
+        std = pc.stddev(values, ddof=1).as_py()
+        std = float("nan") if std is None else std
+        lines.append(
+            f"{col}: count={len(values)} mean={pc.mean(values).as_py():.6e} std={std:.6e} "
+            f"min={min_max['min'].as_py():.6e} max={min_max['max'].as_py():.6e}"
+        )
+    return "\n".join(lines)
+
+
+def run(parquet_path, out_dir, x_col="ET Epoch (s)", y_col="Absolute difference", color_col="source frame"):
+    """
+    Plots `y_col` against `x_col` for the validation data of a single parquet file, once for the position
+    components and once for the velocity components (colored by `color_col`), and once for all of the
+    components together. Returns the paths of the HTML plots written to `out_dir`.
+    Each file is independent, so this runs in a worker process and must not open a browser.
+    """
+    # Only these columns are plotted or summarized, so the other ones are never decoded.
+    columns = list(dict.fromkeys([color_col, "component", x_col, y_col]))
+
+    # Load the validation data: self_destruct frees each Arrow buffer as soon as it is moved into pandas.
+    # The string columns (source frame and component) have a handful of distinct values, so they are
+    # converted straight into categoricals instead of one Python string object per row.
+    table = load_validation(parquet_path, columns)
+    df = table.to_pandas(strings_to_categorical=True, self_destruct=True)
+    del table
+
+    df = df.astype({col: dtype for col, dtype in FLOAT32_COLUMNS.items() if col in df}, copy=False)
+
+    name = basename(parquet_path)
+
+    # The plots only reference the plotly.js bundle, so it must sit next to them
+    write_plotly_js(out_dir)
+
+    html_paths = []
+
+    # Compute the position mask once from the integer component codes: velocity is its complement
+    components = df["component"].cat
+    position_codes = components.categories.get_indexer(POSITION_COMPONENTS)
+    is_position = np.isin(components.codes.to_numpy(), position_codes[position_codes >= 0])
+
+    plt = go.Figure()
+
+    # The figure is reused for the next plot, so each plot is serialized right away and only the
+    # disk writes of the sibling plots overlap.
+    with ThreadPoolExecutor(max_workers=3) as writer:
+        writes = []
+
+        for kind, mask in [("Position", is_position), ("Velocity", ~is_position)]:
+
+            subset = df.loc[mask]
+
+            print(f"== {kind} {name} ==\n{summarize(subset, [x_col, y_col])}")
+
+            scatter(plt, subset, x_col, y_col, color_col, f"Validation of {name} for {kind}")
+
+            html_paths.append(f"{out_dir}/validation-plot-{kind}-{name}.html")
+            writes.append(writer.submit(write_text, html_paths[-1], plt.to_html(include_plotlyjs=PLOTLY_JS)))
 
-import pandas as pd
-import plotly.express as px
+        # Plot all components together
+        scatter(plt, df, x_col, y_col, "component", f"Validation of {name} (overall)")
+        html_paths.append(f"{out_dir}/validation-plot-{name}.html")
+        writes.append(writer.submit(write_text, html_paths[-1], plt.to_html(include_plotlyjs=PLOTLY_JS)))
 
+        for write in writes:
+            write.result()
 
-def is_on_github_actions():
-  if "CI" not in environ or not environ["CI"] or "GITHUB_RUN_ID" not in environ:
-    return False
-  else:
-    return True
+    return html_paths
 
 if __name__ == '__main__':
 
-    target_folder = join(abspath(dirname(__file__)), '..', '..', '..', 'target')
-
-    plotted_anything = False
-
-    for filename in glob(f"{target_folder}/spk-type*.parquet"):
-
-        # Load the parquet file
-        df = pd.read_parquet(filename)
+    parser = ArgumentParser(description="Plot the SPK validation results stored in the target folder")
+    parser.add_argument("--show", action="store_true", help="open the HTML plots in the browser once written")
+    args = parser.parse_args()
 
-        name = basename(filename)
+    target_folder = abspath(join(dirname(__file__), '..', '..', '..', 'target'))
 
-        for kind, columns in [("Position", ["X", "Y", "Z"]),
-                              ("Velocity", ["VX", "VY", "VZ"])]:
+    filenames = glob(f"{target_folder}/spk-type*.parquet")
 
-            print(f"== {kind} {name} ==")
+    with ProcessPoolExecutor(max_workers=cpu_count()) as executor:
+        plot_file = partial(run, out_dir=target_folder)
+        html_paths = [path for paths in executor.map(plot_file, filenames) for path in paths]
 
-            subset = df.loc[df.component.isin(columns)]
+    if args.show:
+        for html_path in html_paths:
+            webbrowser.open(f"file://{html_path}")
 
-            print(subset.describe())
-
-            plt = px.scatter(subset,
-                             x='ET Epoch (s)',
-                             y=f'Absolute difference',
-                             color='source frame',
-                             title=f"Validation of {name} for {kind}")
-
-            plt.write_html(
-                f"{target_folder}/validation-plot-{kind}-{name}.html")
-            if not is_on_github_actions():
-                plt.show()
-            plotted_anything = True
-
-        # Plot all components together
-        plt = px.scatter(df,
-                         x='ET Epoch (s)',
-                         y='Absolute difference',
-                         color='component',
-                         title=f"Validation of {name} (overall)")
-        plt.write_html(f"{target_folder}/validation-plot-{name}.html")
-        if not is_on_github_actions():
-            plt.show()
-        plotted_anything = True
-    assert plotted_anything, "did not plot anything"
+    assert html_paths, "did not plot anything"